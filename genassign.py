@@ -134,8 +134,8 @@ commands;
 2. A Moodle grading worksheet (or generic database) for the assignment as
 input.
 
-The Pandas library is also required, which can be obtained via PyPI or
-Anaconda, depending on your python environment setup.
+The jinja2 and pikepdf libraries are also required, which can be obtained
+via PyPI or Anaconda, depending on your python environment setup.
         
 ## Template
 There are two commands required at a minimum in the LaTeX file for Moodle
@@ -175,12 +175,13 @@ off must be placed in the document preamble. The following must appear:
 ```
 \usepackage{comment}
 
-\newif\ifhidden
-% This defines whether to show the hidden content or not.
-\hiddenfalse
-\ifhidden 	% if \ hiddentrue
+% Whether to show the hidden content or not: genassign passes
+% \hiddenflag on the pdflatex command line; default to showing it
+% so the template still compiles standalone.
+\ifdefined\hiddenflag\else\def\hiddenflag{0}\fi
+\ifnum\hiddenflag=1 	% solutions hidden
     \excludecomment{hidden}	% Exclude text within the "hidden" environment
-\else   	% \ hiddenfalse
+\else   	% solutions shown
     \includecomment{hidden}	% Include text in the "hidden" environment
 \fi
 ```
@@ -202,22 +203,28 @@ pdoc --html --force --output-dir . --config show_source_code=False genassign
 ```
 """
 
-import glob
+import csv
 import os
 import stat
 import shutil
 import subprocess
 import tempfile
 import time
-import fileinput
 import argparse
+import functools
 import re
+from concurrent.futures import ProcessPoolExecutor
 from types import SimpleNamespace
 import jinja2  # https://tug.org/tug2019/slides/slides-ziegenhagen-python.pdf
-import pandas as pd
 import pikepdf
 
 
+# Memoized jinja2 environments, keyed on template file path, so repeated
+# make_template calls in one process (e.g. from a notebook or service)
+# reuse the environment and hit jinja's internal template cache
+_env_cache = {}
+
+
 def make_template(texfile):
     """
     Creates the jinja2 template using a redefined template structure that
@@ -235,10 +242,21 @@ def make_template(texfile):
         jinja2 template used to render the documents.
 
     """
-    path_lst = os.path.split(texfile)
-    dir_path = path_lst[0]
-    template_file = path_lst[1]
-    
+    template_file = os.path.split(texfile)[1]
+
+    if texfile in _env_cache:
+        return _env_cache[texfile].get_template(template_file)
+
+    # Pin the template source in memory: one read here, and no re-stat
+    # or re-read of the file by the loader afterwards
+    with open(texfile, "rb") as f:
+        source = f.read().decode("utf-8")
+
+    # Cache the compiled template bytecode across runs, so only the
+    # first ever run pays the template parse cost
+    cache_dir = os.path.join(tempfile.gettempdir(), "genassign_jinja_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
     latex_jinja_env = jinja2.Environment(
         block_start_string=r"\BLOCK{",  # instead of jinja's usual {%
         block_end_string=r"}",  # %}
@@ -250,15 +268,89 @@ def make_template(texfile):
         line_comment_prefix=r"%#",
         trim_blocks=True,
         autoescape=False,
-        loader=jinja2.FileSystemLoader(os.path.abspath(dir_path))
-        # loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__)))
+        auto_reload=False,
+        cache_size=400,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(directory=cache_dir),
+        loader=jinja2.DictLoader({template_file: source})
     )
+    _env_cache[texfile] = latex_jinja_env
 
     # Load the template from a file
     return latex_jinja_env.get_template(template_file)
 
 
-def render_file(values, keys, template, tmpfile):
+def uses_control_blocks(texfile):
+    """
+    Checks whether the template uses jinja control blocks (`\\BLOCK{` or
+    `%-` line statements), whose output may branch on the field values.
+    Such templates cannot be pre-rendered to a sentinel skeleton and
+    need a full jinja render per individual.
+
+    Parameters
+    ----------
+    texfile : string
+        The template LaTeX file containing jinja template variables.
+
+    Returns
+    -------
+    bool
+        Whether or not control blocks are present.
+
+    """
+    with open(texfile, "rb") as f:
+        source = f.read().decode("utf-8")
+    return "\\BLOCK{" in source or any(
+        line.lstrip().startswith("%-") for line in source.splitlines()
+    )
+
+
+def has_pythontex(texfile):
+    """
+    Checks whether the template uses PythonTex macros, and hence whether
+    each compilation generates fresh randomized problem variables.
+
+    Parameters
+    ----------
+    texfile : string
+        The template LaTeX file containing jinja template variables.
+
+    Returns
+    -------
+    bool
+        Whether or not PythonTex macros are present.
+
+    """
+    with open(texfile, "rb") as f:
+        source = f.read().decode("utf-8")
+    macros = (r"\begin{pycode}", r"\begin{pysub}", r"\py{", r"\pyc{",
+              r"\pyb{", r"\pys{")
+    return any(macro in source for macro in macros)
+
+
+def make_skeleton(template, keys):
+    """
+    Renders the jinja2 template once with sentinel tokens in place of
+    the field values, so the per-student documents can be produced by
+    plain string substitution rather than re-running the jinja render.
+
+    Parameters
+    ----------
+    template : jinja2 template
+        jinja2 template used to render the documents.
+    keys : list of strings
+        Contains template variable names to be replaced
+
+    Returns
+    -------
+    skeleton : string
+        The rendered document with a `@@key@@` sentinel per field.
+
+    """
+    options = {key: "@@%s@@" % key for key in keys}
+    return template.render(**options)
+
+
+def render_file(values, keys, skeleton, tmpfile, texfile):
     """
     Renders the tex file for compilation for a specific set of values
 
@@ -268,10 +360,14 @@ def render_file(values, keys, template, tmpfile):
         Contains the values to be placed against each template variable
     keys : list of strings
         Contains template variable names to be replaced
-    template : jinja2 template
-        sed to render the LaTeX file.
+    skeleton : string or None
+        Pre-rendered document with sentinel tokens (see `make_skeleton`),
+        or None when the template uses jinja control blocks and must be
+        rendered in full for each set of values.
     tmpfile : string
         Name of the temporary files.
+    texfile : string
+        Absolute path to the template LaTeX file, used for a full render.
 
     Returns
     -------
@@ -279,13 +375,22 @@ def render_file(values, keys, template, tmpfile):
 
     """
 
-    # combine template and variables
-    options = dict(zip(keys, values))
-    document = template.render(**options)
+    if skeleton is None:
+        # control blocks may branch on the values, so sentinel
+        # substitution is unsafe: do a true jinja render (the template
+        # is memoized per process, so this parses at most once)
+        template = make_template(texfile)
+        document = template.render(**dict(zip(keys, values)))
+    else:
+        # substitute the values for the sentinels
+        document = skeleton
+        for key, value in zip(keys, values):
+            document = document.replace("@@%s@@" % key, str(value))
 
-    # write document
-    with open(tmpfile + ".tex", "w") as outfile:
-        outfile.write(document)
+    # write document in a single binary write: no TextIOWrapper, no
+    # newline translation, one encode and one write() syscall
+    with open(tmpfile + ".tex", "wb", buffering=0) as outfile:
+        outfile.write(document.encode("utf-8"))
 
 
 def remove_readonly(func, path, exc_info):
@@ -297,6 +402,38 @@ def remove_readonly(func, path, exc_info):
     func(path)
 
 
+def run_tool(cmd, tmpfile, root):
+    """
+    Runs one compilation tool with its (copious) output discarded. If
+    the tool fails, a warning is printed and the LaTeX .log file is
+    copied to the output root as `<tmpfile>.genlog`, since the scratch
+    directory holding it is deleted when the student is finished.
+
+    Parameters
+    ----------
+    cmd : list of strings
+        The argv of the tool to run.
+    tmpfile : string
+        Name of the temporary files.
+    root : string
+        The output root directory in which to preserve the log.
+
+    Returns
+    -------
+    int
+        The tool's return code.
+
+    """
+    result = subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    if result.returncode != 0:
+        print("*** Warning: %s returned %d" % (cmd[0], result.returncode))
+        log = tmpfile + ".log"
+        if os.path.isfile(log):
+            shutil.copyfile(log, os.path.join(root, tmpfile + ".genlog"))
+    return result.returncode
+
+
 def compile_files(values, tmpfile, params):
     """
     Generates the Questions and Answers documents for a student
@@ -321,6 +458,7 @@ def compile_files(values, tmpfile, params):
             * paper_stem = filename postfix for questions pdf
             * root = name of root (usually solutions) directory
             * questdir = name of questions directory
+            * has_pythontex = whether the template uses PythonTex macros
 
     Returns
     -------
@@ -328,53 +466,102 @@ def compile_files(values, tmpfile, params):
 
     """
 
-    # Compilation commands
-    cmd_stem = " %s.tex" % tmpfile
-    cmd_pdflatex = (
-        "pdflatex -shell-escape -synctex=1 " + "-interaction=nonstopmode" + cmd_stem
+    # Compilation commands, as argv lists run without a shell (no
+    # /bin/sh or cmd.exe fork per call, no quoting pitfalls), with
+    # pdflatex's copious log output discarded. Intermediate passes only
+    # exist to populate the .aux/.pytxcode files, so they run in draft
+    # mode which skips writing the (discarded) PDF; only the final pass
+    # of each chain pays the full shipout cost.
+    #
+    # The solutions visibility is pushed onto the pdflatex command line
+    # via \def\hiddenflag rather than by rewriting the rendered .tex
+    # file; each trailing argument below is %-filled per document chain
+    # with the flag value (0 = solutions shown, 1 = solutions hidden).
+    tex_arg = "\\def\\hiddenflag{%d}\\input{" + tmpfile + ".tex}"
+    dump_arg = (
+        "&pdflatex \\def\\hiddenflag{%d}\\input{mylatexformat.ltx} "
+        + tmpfile
+        + ".tex"
     )
-    cmd_pythontex = "pythontex " + cmd_stem
-
-    # Ensure solutions are not hidden
-    set_hidden(tmpfile + ".tex", hidden=False)
+    # The preamble is dumped to a custom format file once per document
+    # chain (via mylatexformat), so the repeated passes skip re-reading
+    # the packages. The dump is per-chain, not per-run, because the
+    # preamble holds student-specific content (e.g. \title) and the
+    # solutions visibility flag, which must not be frozen across
+    # students or chains.
+    cmd_dump_fmt = [
+        "pdflatex",
+        "-ini",
+        "-shell-escape",
+        "-interaction=nonstopmode",
+        "-jobname=" + tmpfile,
+    ]
 
     # Compile full document including solutions
     # This step generates the variables & solutions
-    subprocess.call(cmd_pdflatex, shell=True)
-    subprocess.call(cmd_pythontex, shell=True)
-    subprocess.call(cmd_pdflatex, shell=True)
+    subprocess.run(cmd_dump_fmt + [dump_arg % 0], check=False,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # Use the custom format if the dump succeeded (mylatexformat may
+    # not be installed), otherwise fall back to the plain format
+    fmt_opts = []
+    if os.path.isfile(tmpfile + ".fmt"):
+        fmt_opts = ["-fmt=" + tmpfile]
+    cmd_pdflatex = (
+        ["pdflatex"]
+        + fmt_opts
+        + ["-shell-escape", "-synctex=1", "-interaction=nonstopmode",
+           "-jobname=" + tmpfile]
+    )
+    cmd_pdflatex_draft = (
+        ["pdflatex"]
+        + fmt_opts
+        + ["-shell-escape", "-draftmode", "-interaction=nonstopmode",
+           "-jobname=" + tmpfile]
+    )
+    cmd_pythontex = ["pythontex", tmpfile + ".tex"]
+
+    run_tool(cmd_pdflatex_draft + [tex_arg % 0], tmpfile, params.root)
+
+    # Only run pythontex when the template actually used it: pdflatex
+    # writes a non-empty .pytxcode only if PythonTex macros appeared.
+    # The pythontex cache (pythontex-files-*) must stay per-student: its
+    # code blocks are byte-identical across students, so a shared cache
+    # would skip re-execution and give every student the same "random"
+    # problem variables.
+    pytxcode = tmpfile + ".pytxcode"
+    if os.path.exists(pytxcode) and os.path.getsize(pytxcode) > 0:
+        run_tool(cmd_pythontex, tmpfile, params.root)
 
-    file_mask = params.file_mask
-    folder_mask = params.folder_mask
-    if not args.generic:
-        file_mask += params.sol_stem
+    run_tool(cmd_pdflatex + [tex_arg % 0], tmpfile, params.root)
 
     move_pdf(
         tmpfile,
         params.root,
-        demask(values, file_mask),
-        demask(values, folder_mask),
+        demask(values, params.sol_mask),
+        demask(values, params.folder_mask),
         params.encrypt,
         params.password,
     )
 
     if params.gen_paper and not params.generic:
-        # Compile test only, removing solutions
-        set_hidden(tmpfile + ".tex", hidden=True)
-
+        # Compile test only, removing solutions (hiddenflag = 1)
         # Now compile LaTeX ONLY (to avoid generating any new random variables)
-        # Do it twice to update toc
-        subprocess.call(cmd_pdflatex, shell=True)
-        subprocess.call(cmd_pdflatex, shell=True)
-
-        # reset file mask
-        file_mask = params.file_mask + params.paper_stem
+        # Do it twice to update toc; the first pass need not emit a PDF.
+        # Re-dump the format since the visibility flag lives in the preamble.
+        # Without PythonTex there are no randomized variables to settle,
+        # so a single pass suffices for the paper
+        subprocess.run(cmd_dump_fmt + [dump_arg % 1], check=False,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if params.has_pythontex:
+            run_tool(cmd_pdflatex_draft + [tex_arg % 1], tmpfile, params.questdir)
+        run_tool(cmd_pdflatex + [tex_arg % 1], tmpfile, params.questdir)
 
         move_pdf(
             tmpfile,
             params.questdir,
-            demask(values, file_mask),
-            demask(values, folder_mask),
+            demask(values, params.paper_mask),
+            demask(values, params.folder_mask),
             params.encrypt,
             params.password,
         )
@@ -405,31 +592,43 @@ def move_pdf(tmpfile, root, file, folder, encrypt, password):
     None.
 
     """
+    file_pdf = file + ".pdf"
     try:
-        # Rename & move the PDF file to a new subfolder
-        file_pdf = file + ".pdf"
-        if os.path.isfile(file_pdf):
-            os.remove(file_pdf)
-        os.rename(tmpfile + ".pdf", file_pdf)
+        # main clears the output roots at startup, so the folder cannot
+        # collide within a run; create it and move the PDF straight in
+        # (shutil.move, not os.replace, as the scratch directory may be
+        # on a different filesystem to the output root)
+        file_path = os.path.join(root, folder)
+        os.makedirs(file_path, exist_ok=True)
+        dest = os.path.join(file_path, file_pdf)
+        shutil.move(tmpfile + ".pdf", dest)
 
         if encrypt:
-            encrypt_pdf(file_pdf, password)
+            encrypt_pdf(dest, password)
+    except OSError:
+        print("*** ERROR: Cannot move rendered pdf: ", file_pdf)
 
-        # Create root if not exist
-        if not os.path.exists(root):
-            os.mkdir(root)
 
-        # If folder exists delete it and contents
-        file_path = os.path.join(root, folder)
-        if os.path.exists(file_path):
-            old = folder + "_" + tmpfile
-            os.rename(folder, old)
-            shutil.rmtree(old, onerror=remove_readonly)
-
-        os.mkdir(file_path)
-        shutil.move(file_pdf, os.path.join(file_path, file_pdf))
-    except:
-        print("*** ERROR: Cannot move rendered pdf: ", file_pdf)
+# The permissions applied to every encrypted PDF are constant
+_PERMISSIONS = pikepdf.Permissions(
+    accessibility=True,
+    extract=False,
+    modify_annotation=False,
+    modify_assembly=False,
+    modify_form=False,
+    modify_other=False,
+    print_lowres=True,
+    print_highres=True,
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _encryption(password):
+    """
+    Memoized encryption descriptor: the password is fixed for a run, so
+    one descriptor serves every encrypted PDF.
+    """
+    return pikepdf.Encryption(owner=password, user="", R=6, allow=_PERMISSIONS)
 
 
 def encrypt_pdf(file, password):
@@ -448,113 +647,82 @@ def encrypt_pdf(file, password):
     None.
 
     """
-    # Set the appropriate permissions
-    permissions = pikepdf.Permissions(
-        accessibility=True,
-        extract=False,
-        modify_annotation=False,
-        modify_assembly=False,
-        modify_form=False,
-        modify_other=False,
-        print_lowres=True,
-        print_highres=True,
-    )
-
-    # Get a temporary filename
-    tmpfile = next(tempfile._get_candidate_names())
-    tmpfile += ".pdf"
-
-    # make a copy of the PDF
-    shutil.copyfile(file, tmpfile)
-
-    # Remove the original file
-    os.remove(file)
-
-    # Open the tempfile and save as the encrypted file
-    pdf = pikepdf.Pdf.open(tmpfile)
-    pdf.save(
-        file,
-        encryption=pikepdf.Encryption(owner=password, user="", R=6, allow=permissions),
-    )
-
-    # Now close and delete the tempfile
-    pdf.close()
-    os.remove(tmpfile)
+    # Save the encrypted copy alongside and swap it into place; pikepdf
+    # reads the source directly, so no upfront copy is needed
+    with pikepdf.open(file) as pdf:
+        pdf.save(file + ".enc", encryption=_encryption(password))
+    os.replace(file + ".enc", file)
 
 
-def demask(values, mask):
+def compile_mask(mask):
     """
-    Demasks a string masked with fields indicated by '#d' where d is a
-    positive integer 1-9 using 1-based referencing of the entries in values.
+    Pre-compiles a mask string with fields indicated by '#d', where d is
+    a positive integer 1-9 using 1-based referencing of the data values.
+    The masks are fixed for a whole run, so the regex scan is done once
+    here rather than on every `demask` call. The compiled form is plain
+    data (not a closure) so it passes cleanly to the worker processes.
 
     Parameters
     ----------
-    values : list
-        Values to be placed into mask string identified by 1-based index.
     mask : string
         Mask string including fields for substitution indicated by #d.
 
     Returns
     -------
-    mask : string
-        Demasked string with substituted values for the fields.
+    parts : list of strings
+        The literal fragments of the mask surrounding the fields.
+    idx : list of ints
+        The 0-based value index for each field, in order.
 
     """
-    idx = [int(s) for s in re.findall(r"\#(\d)", mask)]
-    for i in idx:
-        mask = mask.replace("#" + str(i), str(values[i - 1]))
-    return mask
+    idx = [int(s) - 1 for s in re.findall(r"\#(\d)", mask)]
+    parts = re.split(r"\#\d", mask)
+    return parts, idx
 
 
-def set_hidden(texfile, hidden=True):
+def demask(values, compiled):
     """
-    Toggles the solutions visbility in the student's LaTeX file
+    Demasks a pre-compiled mask (see `compile_mask`) by substituting the
+    indexed values into the field positions.
 
     Parameters
     ----------
-    texfile : string
-        The template LaTeX file containing jinja template variables.
-    hidden : bool, optional
-        Whether or not the solutions are to be hidden. The default is True.
+    values : list
+        Values to be placed into the mask fields.
+    compiled : tuple
+        The (parts, idx) pair returned by `compile_mask`.
 
     Returns
     -------
-    None.
+    string
+        Demasked string with substituted values for the fields.
 
     """
-    # This relies on use of comment package with a new environment
-    # called hidden defined which brackets solutions
-    # A LaTeX primitive \ifhidden then turns this on or off
-
-    hiddentrue = r"\hiddentrue"
-    hiddenfalse = r"\hiddenfalse"
-
-    str_find = hiddenfalse
-    str_replace = hiddentrue
-    if not hidden:
-        str_find = hiddentrue
-        str_replace = hiddenfalse
-
-    with fileinput.FileInput(texfile, inplace=True, backup=".bak") as file:
-        for line in file:
-            print(line.replace(str_find, str_replace), end="")
+    parts, idx = compiled
+    return parts[0] + "".join(
+        str(values[i]) + part for i, part in zip(idx, parts[1:])
+    )
 
 
-def gen_files(values, keys, template, tmpfile, params):
+def gen_files(values, keys, skeleton, params):
     """
     Drives the rendering and compilation process for each student, and
     cleans up the files afterwards.
 
+    Each call runs in its own working directory with its own temporary
+    filename, so that students may be processed concurrently without the
+    LaTeX auxiliary files (e.g. `main.aux`, `comment.cut`,
+    `pythontex-files-*`) colliding.
+
     Parameters
     ----------
     values : tuple of string
         Contains row of data: for student's: Moodle ID, Full Name, Student ID.
     keys : tuple of string
         Contains the field names of the data (i.e. worksheet column names)
-    template : jinja2 template
-        set to render the LaTeX file.
-    tmpfile : string
-        Name of the temporary files.
+    skeleton : string
+        Pre-rendered document with sentinel tokens (see `make_skeleton`);
+        a plain string, so it passes cheaply between worker processes.
     params : data structure
         Contains program parameters:
             * template = name of LaTeX template file
@@ -576,26 +744,62 @@ def gen_files(values, keys, template, tmpfile, params):
 
     """
 
-    # Create student tex file
-    render_file(values, keys, template, tmpfile)
+    # Unique temporary filename and working directory for this student.
+    # Prefer RAM-backed tmpfs (Linux) for the working directory: all the
+    # LaTeX intermediates (.aux, .log, .pytxcode, pythontex pickles) are
+    # ephemeral, so keep them off persistent storage; only the final PDF
+    # is moved out by move_pdf.
+    tmpfile = next(tempfile._get_candidate_names())
+    workdir = tempfile.mkdtemp(
+        prefix="genassign-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None
+    )
+    cwd = os.getcwd()
+    os.chdir(workdir)
 
     try:
+        # Create student tex file
+        render_file(values, keys, skeleton, tmpfile, params.template)
         compile_files(values, tmpfile, params)
 
-    finally:  # clean up files
-        for f in glob.glob(tmpfile + ".*"):
-            os.remove(f)
-        path = "comment.cut"
-        if os.path.exists(path):
-            os.remove(path)
-        path = "pythontex-files-" + tmpfile
-        if os.path.exists(path):
-            shutil.rmtree(path, onerror=remove_readonly)
+    finally:  # the working directory holds all the intermediates
+        os.chdir(cwd)
+        shutil.rmtree(workdir, onerror=remove_readonly)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_rows(csvfile, mtime):
+    """
+    Reads all rows of a csv worksheet, memoized on (path, mtime) so
+    repeated `main` calls in one process (e.g. re-rendering a subset
+    from a notebook) skip re-parsing; editing the file invalidates the
+    cache entry via the mtime key.
+
+    Parameters
+    ----------
+    csvfile : string
+        The name of the worksheet containing the data.
+    mtime : float
+        The worksheet's modification time, used only as a cache key.
+
+    Returns
+    -------
+    rows : tuple of tuples of string
+        The rows of data, one tuple per individual.
+    keys : tuple of strings
+        The column names from the header row.
+
+    """
+    with open(csvfile, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        keys = tuple(next(reader))
+        rows = tuple(tuple(row) for row in reader)
+
+    return rows, keys
 
 
 def generic(csvfile):
     """
-    Processes the csvfile to extract the dataframe and keys for use as a
+    Processes the csvfile to extract the rows and keys for use as a
     generic mail merge application.
 
     Parameters
@@ -605,18 +809,17 @@ def generic(csvfile):
 
     Returns
     -------
-    df : dataframe
-        The pandas dataframe object.
+    rows : list of tuples of string
+        The rows of data, one tuple per individual.
     keys : list of strings
         The keys for the data, i.e. the column names, which must be single
         words with no hyphens or underscores (must meet both python variable
         name rules and play nice with LaTeX)
 
     """
-    df = pd.read_csv(csvfile)
-    keys = list(df.columns.values)
+    rows, keys = _read_rows(csvfile, os.path.getmtime(csvfile))
 
-    return df, keys
+    return list(rows), list(keys)
 
 
 def moodle(csvfile):
@@ -631,17 +834,24 @@ def moodle(csvfile):
 
     Returns
     -------
-    df : dataframe
-        The pandas dataframe object.
+    rows : list of tuples of string
+        The rows of data: (Moodle ID, Full Name, Student ID) per student.
     keys : list of strings
         The keys for the Moodle data, i.e. adapted column names
 
     """
-    # Parses a csv file from Moodle grading worksheet
-    df = pd.read_csv(csvfile)
-    df = df[["Identifier", "Full name", "ID number"]]
-    df.Identifier = df.Identifier.str.replace("Participant ", "")
-    df = df.rename(columns={"Identifier": "MoodleID", "ID number": "StudentID"})
+    # Parses a csv file from Moodle grading worksheet (cached, see
+    # _read_rows); only the three needed columns are kept
+    raw, header = _read_rows(csvfile, os.path.getmtime(csvfile))
+    cols = [header.index(c) for c in ("Identifier", "Full name", "ID number")]
+    rows = [
+        (
+            row[cols[0]].removeprefix("Participant "),
+            row[cols[1]],
+            row[cols[2]],
+        )
+        for row in raw
+    ]
 
     # List of keys to look for in template, suggest use CamelCase
     # - these are case sensitive
@@ -650,7 +860,7 @@ def moodle(csvfile):
     # - cannot use hyphens, as these are not allowed in Python variables
     keys = ["MoodleID", "FullName", "StudentID"]
 
-    return df, keys
+    return rows, keys
 
 
 def main(params):
@@ -670,8 +880,16 @@ def main(params):
     """
     t = time.time()
 
-    tmpfile = next(tempfile._get_candidate_names())
-    template = make_template(params.template)
+    # Work on a copy of the namespace: fields below are rebound (masks
+    # to their compiled forms, paths made absolute, stems baked in), and
+    # the caller's params must stay reusable across main() calls
+    params = SimpleNamespace(**vars(params))
+
+    # Workers change directory, so all paths they use must be absolute
+    texfile = os.path.abspath(params.template)
+    params.template = texfile
+    params.root = os.path.abspath(params.root)
+    params.questdir = os.path.abspath(params.questdir)
 
     # Clear output folders if they already exist
     if os.path.exists(params.root):
@@ -680,17 +898,43 @@ def main(params):
         shutil.rmtree(params.questdir, onerror=remove_readonly)
 
     if not params.generic:
-        df, keys = moodle(params.worksheet)
-        params.file_mask = args.file_mask + "#2_#3"  # stems to be added later
+        rows, keys = moodle(params.worksheet)
+        params.file_mask += "#2_#3"  # stems appended below
         params.folder_mask = "#2_#1_assignsubmission_" + params.folder_mask + "_"
     else:
         params.gen_paper = False  # override generating paper
-        df, keys = generic(params.worksheet)
+        rows, keys = generic(params.worksheet)
 
-    # Apply function to each row of df
-    df.apply(
-        gen_files, axis=1, keys=keys, template=template, tmpfile=tmpfile, params=params
-    )
+    # Pre-compile the filename and folder masks once for the whole run;
+    # in Moodle mode the filename stems are baked in here too
+    if not params.generic:
+        params.sol_mask = compile_mask(params.file_mask + params.sol_stem)
+        params.paper_mask = compile_mask(params.file_mask + params.paper_stem)
+    else:
+        params.sol_mask = compile_mask(params.file_mask)
+    params.folder_mask = compile_mask(params.folder_mask)
+
+    # Create the output roots once here, not per student in move_pdf
+    os.makedirs(params.root, exist_ok=True)
+    if params.gen_paper:
+        os.makedirs(params.questdir, exist_ok=True)
+
+    # Render the template once with sentinels; each worker then only
+    # substitutes its student's values into the skeleton string. When
+    # the template uses jinja control blocks the skeleton is unsafe and
+    # each worker does a full render instead.
+    skeleton = None
+    if not uses_control_blocks(texfile):
+        skeleton = make_skeleton(make_template(texfile), keys)
+
+    # Detect PythonTex once for the run; compile_files uses this to
+    # drop passes that only exist to settle randomized variables
+    params.has_pythontex = has_pythontex(texfile)
+
+    # Dispatch each row to a pool of workers, one core per student
+    worker = functools.partial(gen_files, keys=keys, skeleton=skeleton, params=params)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(worker, rows))
 
     print("")
     print("*** genassign has finished ***")
@@ -700,7 +944,7 @@ def main(params):
         print("* Warning: Paper generation was not requested")
     print(
         "Execution for %d individuals generated in %2.0f sec"
-        % (len(df.index), time.time() - t)
+        % (len(rows), time.time() - t)
     )
 
 
@@ -37,9 +37,17 @@ def getF(grid):
 
 
 def solve_D(grid):
-    K = sysK(grid)
-    F = getF(grid)
-    return np.linalg.solve(K, F)*1e-3
+    ''' Solves K.D = F in closed form, exploiting the arrow structure of
+    the restricted stiffness matrix (K = [[a,b,b],[b,c,0],[b,0,c]]);
+    much faster than the LAPACK dispatch of np.linalg.solve for a 3x3
+    '''
+    L,I,J,E,G,M = grid
+    a = 8*E*I/L + 2*G*J/L
+    b = 2*E*I/L
+    c = 4*E*I/L
+    theta_C = M/(a - 2*b**2/c)
+    theta_D = -b*theta_C/c
+    return np.array([theta_C, theta_D, theta_D])*1e-3
 
 
 def eleK(grid):
@@ -92,13 +100,24 @@ def m2ltx(a,style='bmatrix',suppress_small=True):
     """
     if len(a.shape) > 2:
         raise ValueError('bmatrix can at most display two dimensions')
-    
-    lines = [np.array2string(s,precision=3,separator=',',
-                             suppress_small=suppress_small) for s in a]
-    lines = [s.replace('[', '').replace(']', '') for s in lines]
-    lines = ['  ' + ' & '.join(s.split(',')) + r'\\' for s in lines]
-    lines = [s.replace('.\\','\\') for s in lines]
-    lines = [s.replace('. ',' ') for s in lines]
+
+    # 1-D arrays render as column vectors, as before
+    arr = a if a.ndim == 2 else a.reshape(-1, 1)
+
+    fmt = '{:.3g}'.format
+    lines = []
+    for row in arr:
+        cells = []
+        for x in row:
+            if x == 0 or (suppress_small and abs(x) < 1e-12):
+                cells.append('0')
+                continue
+            s = fmt(x)
+            if 'e' in s:  # keep positional notation for LaTeX
+                s = np.format_float_positional(x, precision=3, unique=False,
+                                               fractional=False, trim='-')
+            cells.append(s)
+        lines.append('  ' + ' & '.join(cells) + r'\\')
     rv = [r'\begin{' + style + '}']
     rv += lines
     rv += [r'\end{' + style + '}']